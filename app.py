@@ -1,51 +1,359 @@
+import json
 import os
 import sys
 
-from flask import Flask, jsonify, abort, request, redirect
+from flask import (
+    Flask, jsonify, abort, request, redirect, current_app, Response,
+    stream_with_context
+)
 from flask_cors import CORS
-import markdown
-from src.models import setup_db, MenuItem, Category, Size, update
-from src.auth import requires_auth
-
-ITEMS_PER_PAGE = 10
+from sqlalchemy import true
+from werkzeug.exceptions import ServiceUnavailable
+from src.pages import MarkdownPage
+from src.models import (
+    setup_db, database_path, db, pool_wait_stats, replicas, replica_read,
+    READ_REPLICA_URLS, MenuItem, MenuSnapshot, Category, Size, ChangeLog,
+    update
+)
+from src.auth import (
+    requires_auth, check_permissions, jwks_cache, token_cache
+)
+from src.cache import response_cache
+from src.metrics import metrics
+from src.serialization import json_provider
+from src.compression import compressor
+from src.ratelimit import rate_limiter, load_shedder
+from src.health import readiness, warmup
+from src.batch import (
+    BatchError, apply_batch, validate_operation, permission
+)
+from src.changes import change_feed
+
+ITEMS_PER_PAGE = int(os.getenv('ITEMS_PER_PAGE', 10))
+MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 100))
+RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', 60))
+RESPONSE_CACHE_SIZE = int(os.getenv('RESPONSE_CACHE_SIZE', 1024))
+REDIS_URL = os.getenv('REDIS_URL')
+BULK_MAX_ROWS = int(os.getenv('BULK_MAX_ROWS', 5000))
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 500))
+BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 100))
+JSON_ENCODER = os.getenv('JSON_ENCODER', 'auto')
+MENU_SNAPSHOTS = os.getenv('MENU_SNAPSHOTS', 'true') == 'true'
+COMPRESSION = os.getenv('COMPRESSION', 'true') == 'true'
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 6))
+COMPRESS_CACHE_SIZE = int(os.getenv('COMPRESS_CACHE_SIZE', 256))
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'false') == 'true'
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', 10))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', 50))
+RATE_LIMIT_IP_PER_SECOND = float(os.getenv('RATE_LIMIT_IP_PER_SECOND', 20))
+RATE_LIMIT_IP_BURST = int(os.getenv('RATE_LIMIT_IP_BURST', 100))
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv('RATE_LIMIT_TRUSTED_PROXIES', 0))
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 10000))
+SHED_MAX_IN_FLIGHT = int(os.getenv('SHED_MAX_IN_FLIGHT', 0))
+SHED_MAX_QUEUE_MS = int(os.getenv('SHED_MAX_QUEUE_MS', 0))
+CHANGES_STREAM = os.getenv('CHANGES_STREAM', 'false') == 'true'
+CHANGES_HEARTBEAT_SECONDS = int(os.getenv('CHANGES_HEARTBEAT_SECONDS', 15))
+CHANGES_STREAM_SECONDS = int(os.getenv('CHANGES_STREAM_SECONDS', 25))
+CHANGES_MAX_STREAMS = int(os.getenv('CHANGES_MAX_STREAMS', 100))
+CHANGES_LISTEN = os.getenv('CHANGES_LISTEN', 'true') == 'true'
+READINESS_TIMEOUT_MS = int(os.getenv('READINESS_TIMEOUT_MS', 2000))
+WARMUP = os.getenv('WARMUP', 'false') == 'true'
+WARMUP_CONNECTIONS = int(os.getenv('WARMUP_CONNECTIONS', 2))
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true') == 'true'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 0))
 LOGIN_URL = os.getenv('LOGIN_URL')
 LOGIN_LOCAL_URL = os.getenv('LOGIN_LOCAL_URL')
 
 
-def paginate(request, selection):
-    page = request.args.get('page', 1, type=int)
-    start = (page - 1) * ITEMS_PER_PAGE
-    end = start + ITEMS_PER_PAGE
-
-    items = [item.format() for item in selection]
-    current_items = items[start:end]
-    if len(current_items) == 0:
+def paginate(request, query, key, ranking=None):
+    """Fetches one page of `query` ordered by `key` in the database
+
+    `?page=N` pages with LIMIT/OFFSET, `?after=<key>` switches to keyset
+    pagination for deep pages. `?limit=N` sets the page size, capped at
+    MAX_PAGE_SIZE. Returns the page rows, the total row count and the
+    cursor of the next page (None on the last page).
+    Queries ordered by a `ranking` expression (best first) only support
+    `?page=N`.
+    """
+    limit = request.args.get(
+        'limit', current_app.config['ITEMS_PER_PAGE'], type=int)
+    if limit < 1:
+        abort(422)
+    limit = min(limit, current_app.config['MAX_PAGE_SIZE'])
+
+    after = request.args.get('after', None, type=int)
+    if after is not None and ranking is not None:
+        abort(422)
+    if after is not None:
+        page_query = query.filter(key > after).order_by(key)
+    else:
+        page = request.args.get('page', 1, type=int)
+        if page < 1:
+            abort(404)
+        order = (key,) if ranking is None else (ranking.desc(), key)
+        page_query = query.order_by(*order).offset((page - 1) * limit)
+
+    rows = page_query.limit(limit).all()
+    if len(rows) == 0:
         abort(404)
-    return current_items
+
+    total = query.order_by(None).count()
+    next_after = None
+    if ranking is None and len(rows) == limit:
+        next_after = getattr(rows[-1], key.key)
+    return rows, total, next_after
+
+
+def get_expand(request):
+    '''
+    relationships the client asked to embed with `?expand=sizes,category`,
+    `?expand=` embeds nothing and no argument keeps the default
+    '''
+    if 'expand' not in request.args:
+        return MenuItem.DEFAULT_EXPAND
+    expand = tuple(
+        name for name in request.args['expand'].split(',') if name)
+    if any(name not in MenuItem.EXPANDABLE for name in expand):
+        abort(422)
+    return expand
+
+
+def get_fields(request, model):
+    '''
+    the fields the client asked for with `?fields=id,name`, None for all
+    '''
+    if 'fields' not in request.args:
+        return None
+    fields = set(name for name in request.args['fields'].split(',') if name)
+    if not fields or any(name not in model.SELECTABLE for name in fields):
+        abort(422)
+    return fields
+
+
+def get_ids(request):
+    '''
+    the item ids of `?ids=1,5,9` in request order without duplicates,
+    None without the argument
+    '''
+    if 'ids' not in request.args:
+        return None
+    try:
+        ids = [int(item_id) for item_id in request.args['ids'].split(',')
+               if item_id]
+    except ValueError:
+        abort(422)
+    ids = list(dict.fromkeys(ids))
+    if not ids or len(ids) > current_app.config['MAX_PAGE_SIZE']:
+        abort(422)
+    return ids
+
+
+def fetch_menu_items(ids, expand, fields):
+    '''
+    the formatted items of `ids` by id, read with one IN query (plus one
+    for the sizes when they aren't read from the snapshots)
+    '''
+    if current_app.config['MENU_SNAPSHOTS'] and fields is None:
+        return {
+            item_id: MenuSnapshot.format_document(document, expand)
+            for item_id, document in MenuSnapshot.lookup_many(ids).items()
+        }
+    rows = MenuItem.rows(MenuItem.live().filter(MenuItem.id.in_(ids)),
+                         expand, fields).all()
+    items = MenuItem.format_rows(rows, expand, fields)
+    return {row.id: item for row, item in zip(rows, items)}
+
+
+def get_bulk_rows(request):
+    '''
+    rows of a bulk request, either a JSON array or NDJSON (one object a line)
+    lines that can't be parsed are kept as None so they get reported
+    '''
+    if request.mimetype == 'application/x-ndjson':
+        rows = []
+        for line in request.get_data(as_text=True).splitlines():
+            if not line.strip():
+                continue
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                rows.append(None)
+        return rows
+    rows = request.get_json(silent=True)
+    if not isinstance(rows, list):
+        abort(422)
+    return rows
+
+
+def is_integer(value):
+    # JSON booleans are not integers
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_menu_item_row(row, category_ids, size_ids):
+    '''
+    returns the column values of a bulk menu item row and a list of errors
+    '''
+    if not isinstance(row, dict):
+        return None, ['row is not a JSON object']
+    errors = []
+    values = {'active': row.get('active', True)}
+    if 'item_id' in row:
+        if not is_integer(row['item_id']):
+            errors.append('item_id must be an integer')
+        values['id'] = row['item_id']
+    for field in ('name', 'description', 'ingredients'):
+        if not isinstance(row.get(field), str) or not row[field]:
+            errors.append(field + ' is required')
+        values[field] = row.get(field)
+    if not is_integer(row.get('category')) or \
+            row['category'] not in category_ids:
+        errors.append('category does not exist')
+    values['category_id'] = row.get('category')
+    if not isinstance(values['active'], bool):
+        errors.append('active must be a boolean')
+    if 'sizes' in row:
+        sizes = row['sizes']
+        if not isinstance(sizes, list) or any(
+                not is_integer(size_id) or size_id not in size_ids
+                for size_id in sizes):
+            errors.append('sizes must be a list of existing size ids')
+        else:
+            values['sizes'] = list(dict.fromkeys(sizes))
+    return values, errors
+
+
+def retry_after_header(error):
+    retry_after = getattr(error, 'retry_after', None)
+    return {'Retry-After': str(retry_after)} if retry_after else {}
+
+
+def collect_component_stats():
+    '''
+    caches and connection pool figures published on /metrics
+    '''
+    stats = {'superburger_jwks_keys': len(jwks_cache.keys)}
+    for name, value in token_cache.stats().items():
+        stats['superburger_token_cache_' + name] = int(value)
+    for name, value in response_cache.stats().items():
+        if name != 'backend':
+            stats['superburger_response_cache_' + name] = value
+    for name, value in pool_wait_stats.stats().items():
+        stats['superburger_db_pool_' + name] = value
+    for name, value in replicas.stats().items():
+        stats['superburger_db_' + name] = value
+    for name, value in rate_limiter.stats().items():
+        stats['superburger_rate_limit_' + name] = value
+    for name, value in load_shedder.stats().items():
+        stats['superburger_load_shedder_' + name] = value
+    stats['superburger_change_streams'] = change_feed.streams
+    return stats
+
+
+metrics.add_collector(collect_component_stats)
 
 
 def create_app(test_config=None):
     app = Flask(__name__)
-    setup_db(app)
+    app.config.from_mapping(
+        ITEMS_PER_PAGE=ITEMS_PER_PAGE,
+        MAX_PAGE_SIZE=MAX_PAGE_SIZE,
+        RESPONSE_CACHE_BACKEND=RESPONSE_CACHE_BACKEND,
+        RESPONSE_CACHE_TTL=RESPONSE_CACHE_TTL,
+        RESPONSE_CACHE_SIZE=RESPONSE_CACHE_SIZE,
+        REDIS_URL=REDIS_URL,
+        BULK_MAX_ROWS=BULK_MAX_ROWS,
+        EXPORT_CHUNK_SIZE=EXPORT_CHUNK_SIZE,
+        BATCH_MAX_OPERATIONS=BATCH_MAX_OPERATIONS,
+        JSON_ENCODER=JSON_ENCODER,
+        MENU_SNAPSHOTS=MENU_SNAPSHOTS,
+        COMPRESSION=COMPRESSION,
+        COMPRESS_MIN_SIZE=COMPRESS_MIN_SIZE,
+        COMPRESS_LEVEL=COMPRESS_LEVEL,
+        COMPRESS_CACHE_SIZE=COMPRESS_CACHE_SIZE,
+        RATE_LIMIT_ENABLED=RATE_LIMIT_ENABLED,
+        RATE_LIMIT_BACKEND=RATE_LIMIT_BACKEND,
+        RATE_LIMIT_PER_SECOND=RATE_LIMIT_PER_SECOND,
+        RATE_LIMIT_BURST=RATE_LIMIT_BURST,
+        RATE_LIMIT_IP_PER_SECOND=RATE_LIMIT_IP_PER_SECOND,
+        RATE_LIMIT_IP_BURST=RATE_LIMIT_IP_BURST,
+        RATE_LIMIT_TRUSTED_PROXIES=RATE_LIMIT_TRUSTED_PROXIES,
+        RATE_LIMIT_MAX_KEYS=RATE_LIMIT_MAX_KEYS,
+        SHED_MAX_IN_FLIGHT=SHED_MAX_IN_FLIGHT,
+        SHED_MAX_QUEUE_MS=SHED_MAX_QUEUE_MS,
+        CHANGES_STREAM=CHANGES_STREAM,
+        CHANGES_HEARTBEAT_SECONDS=CHANGES_HEARTBEAT_SECONDS,
+        CHANGES_STREAM_SECONDS=CHANGES_STREAM_SECONDS,
+        CHANGES_MAX_STREAMS=CHANGES_MAX_STREAMS,
+        CHANGES_LISTEN=CHANGES_LISTEN,
+        READINESS_TIMEOUT_MS=READINESS_TIMEOUT_MS,
+        WARMUP=WARMUP,
+        WARMUP_CONNECTIONS=WARMUP_CONNECTIONS,
+        METRICS_ENABLED=METRICS_ENABLED,
+        SLOW_REQUEST_MS=SLOW_REQUEST_MS,
+    )
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    setup_db(app, app.config.get('DATABASE_URL', database_path),
+             app.config.get('READ_REPLICA_URLS', READ_REPLICA_URLS))
+    response_cache.init_app(app)
+    json_provider.init_app(app)
+    compressor.init_app(app)
+    rate_limiter.init_app(app)
+    load_shedder.init_app(app)
+    load_shedder.exempt.update(('get_metrics', 'healthz', 'readyz',
+                                'stream_changes'))
+    change_feed.init_app(app)
+    metrics.slow_request_seconds = app.config['SLOW_REQUEST_MS'] / 1000
     CORS(app)
 
+    # Instrumentation
+
+    @app.before_request
+    def start_request_metrics():
+        metrics.start_request()
+
+    @app.after_request
+    def record_request_metrics(response):
+        metrics.end_request(request, response)
+        return response
+
+    @app.route('/metrics')
+    def get_metrics():
+        if not app.config['METRICS_ENABLED']:
+            abort(404)
+        return Response(metrics.render(),
+                        mimetype='text/plain; version=0.0.4')
+
+    # Health checks
+
+    @app.route('/healthz')
+    def healthz():
+        return jsonify({"status": "ok"})
+
+    @app.route('/readyz')
+    def readyz():
+        ready, checks = readiness(
+            app, app.config['READINESS_TIMEOUT_MS'] / 1000)
+        return jsonify({
+            "ready": ready,
+            "checks": checks
+        }), 200 if ready else 503
+
+    readme_page = MarkdownPage(os.path.join(app.root_path, "README.md"))
+    api_reference_page = MarkdownPage(
+        os.path.join(app.root_path, "APIReference.md"))
+
     @app.route('/')
     def get_readme():
-        readme_file = open("README.md", "r")
-        md_template_string = markdown.markdown(
-            readme_file.read()
-        )
-
-        return md_template_string
+        return readme_page.response(request)
 
     @app.route('/api_reference')
     def get_api_reference():
-        readme_file = open("APIReference.md", "r")
-        md_template_string = markdown.markdown(
-            readme_file.read()
-        )
-
-        return md_template_string
+        return api_reference_page.response(request)
 
     @app.route('/login')
     def get_login_url():
@@ -57,29 +365,146 @@ def create_app(test_config=None):
 
     @app.route('/menuitems', methods=["GET"])
     @requires_auth('get:menu_items')
+    @response_cache.cached('menu_items', 'menu_items_sizes', 'sizes',
+                           'categories')
+    @replica_read
     def get_menu_items(jwt):
-        paginated_menu = []
+        expand = get_expand(request)
+        fields = get_fields(request, MenuItem)
+        ids = get_ids(request)
+        if ids is not None:
+            found = fetch_menu_items(ids, expand, fields)
+            return json_provider.response({
+                'success': True,
+                'menu_items': [found[item_id] for item_id in ids
+                               if item_id in found],
+                'missing': [item_id for item_id in ids
+                            if item_id not in found]
+            })
+        if app.config['MENU_SNAPSHOTS'] and fields is None:
+            rows, total_items, next_after = paginate(
+                request, MenuSnapshot.rows(), MenuSnapshot.item_id)
+            menu_items = [MenuSnapshot.format_document(row.document, expand)
+                          for row in rows]
+        else:
+            rows, total_items, next_after = paginate(
+                request, MenuItem.rows(MenuItem.live(), expand, fields),
+                MenuItem.id)
+            menu_items = MenuItem.format_rows(rows, expand, fields)
         try:
-            items = MenuItem.query.order_by(MenuItem.id).all()
-            paginated_menu = paginate(request, items)
-
-            return jsonify({
+            return json_provider.response({
                 'success': True,
-                'menu_items': paginated_menu,
-                'total_items': len(items)
+                'menu_items': menu_items,
+                'total_items': total_items,
+                'next_after': next_after
             })
         except BaseException:
-            if len(items) or len(paginated_menu) == 0:
-                abort(404)
             abort(500)
 
+    @app.route('/admin/menuitems', methods=["GET"])
+    @requires_auth('get:admin_menu_items')
+    @response_cache.cached('menu_items', 'menu_items_sizes', 'sizes',
+                           'categories')
+    def get_all_menu_items(jwt):
+        expand = get_expand(request)
+        fields = get_fields(request, MenuItem)
+        query = MenuItem.query
+        for name, column in (('deleted', MenuItem.deleted_at.isnot(None)),
+                             ('active', MenuItem.active == true())):
+            value = request.args.get(name, None)
+            if value not in (None, 'true', 'false'):
+                abort(422)
+            if value is not None:
+                query = query.filter(column if value == 'true' else ~column)
+        rows, total_items, next_after = paginate(
+            request, MenuItem.rows(query, expand, fields).add_columns(
+                MenuItem.deleted_at), MenuItem.id)
+        menu_items = MenuItem.format_rows(rows, expand, fields)
+        for row, item in zip(rows, menu_items):
+            item['deleted_at'] = row.deleted_at and \
+                row.deleted_at.isoformat()
+        return json_provider.response({
+            'success': True,
+            'menu_items': menu_items,
+            'total_items': total_items,
+            'next_after': next_after
+        })
+
+    @app.route('/menuitems/search', methods=["GET"])
+    @requires_auth('get:menu_items')
+    @response_cache.cached('menu_items', 'menu_items_sizes', 'sizes',
+                           'categories')
+    @replica_read
+    def search_menu_items(jwt):
+        expand = get_expand(request)
+        fields = get_fields(request, MenuItem)
+        active = request.args.get('active', 'true')
+        if active not in ('true', 'false'):
+            abort(422)
+        query, rank = MenuItem.search(
+            request.args.get('q', '').strip(),
+            category_id=request.args.get('category', None, type=int),
+            active=active == 'true',
+            size_id=request.args.get('size', None, type=int))
+        rows, total_items, next_after = paginate(
+            request, MenuItem.rows(query, expand, fields), MenuItem.id,
+            ranking=rank)
+        return json_provider.response({
+            'success': True,
+            'menu_items': MenuItem.format_rows(rows, expand, fields),
+            'total_items': total_items,
+            'next_after': next_after
+        })
+
+    @app.route('/menuitems/export', methods=["GET"])
+    @requires_auth('get:menu_items')
+    def export_menu_items(jwt):
+        since = request.args.get('since', None, type=int)
+        export_format = request.args.get('format', 'ndjson')
+        if export_format not in ('ndjson', 'json'):
+            abort(422)
+        items = MenuItem.export(since, app.config['EXPORT_CHUNK_SIZE'])
+
+        def generate_ndjson():
+            for item in items:
+                yield json_provider.dumps(item)
+                yield '\n'
+
+        def generate_json():
+            yield '{"success": true, "menu_items": ['
+            for index, item in enumerate(items):
+                if index:
+                    yield ','
+                yield json_provider.dumps(item)
+            yield ']}\n'
+
+        if export_format == 'ndjson':
+            return Response(stream_with_context(generate_ndjson()),
+                            mimetype='application/x-ndjson')
+        return Response(stream_with_context(generate_json()),
+                        mimetype='application/json')
+
     @app.route('/menuitems/<int:item_id>', methods=["GET"])
     @requires_auth('get:item_details')
+    @response_cache.cached('menu_items', 'menu_items_sizes', 'sizes',
+                           'categories')
+    @replica_read
     def get_item_details(jwt, item_id):
+        expand = get_expand(request)
+        if app.config['MENU_SNAPSHOTS']:
+            document = MenuSnapshot.lookup(item_id)
+            if document is None:
+                abort(404)
+            return jsonify({
+                'success': True,
+                'menu_item': MenuSnapshot.format_document(document, expand),
+            })
         try:
-            item = MenuItem.query.filter(MenuItem.id == item_id).one_or_none()
+            item = MenuItem.live().options(
+                *MenuItem.load_options(expand)
+            ).filter(MenuItem.id == item_id).one_or_none()
 
-            formated_item = item.format()
+            formated_item = item.format(expand)
             return jsonify({
                 'success': True,
                 'menu_item': formated_item,
@@ -101,17 +526,30 @@ def create_app(test_config=None):
             ingredients = data.get('ingredients', 'Test')
             active = data.get('active', True)
 
+            deleted = None
             if 'item_id' in data:
                 item_id = data.get('item_id', )
+                deleted = MenuItem.query.filter(
+                    MenuItem.id == item_id,
+                    MenuItem.deleted_at.isnot(None)).one_or_none()
+            if deleted is not None:
+                # adding a deleted item again brings it back
+                item = deleted
+                item.name, item.category_id = name, category
+                item.description, item.ingredients = description, ingredients
+                item.active = active
+                item.restore()
+            elif 'item_id' in data:
                 item = MenuItem(id=item_id, name=name, category_id=category,
                                 description=description,
                                 ingredients=ingredients,
                                 active=active, )
+                item.insert()
             else:
                 item = MenuItem(name=name, category_id=category,
                                 description=description,
                                 ingredients=ingredients, active=active, )
-            item.insert()
+                item.insert()
             return jsonify({
                 'success': True,
                 'new_item': item.format(),
@@ -119,11 +557,106 @@ def create_app(test_config=None):
         except BaseException:
             abort(500)
 
+    @app.route('/menuitems/bulk', methods=["POST"])
+    @requires_auth('post:menu_item')
+    def bulk_upsert_menu_items(jwt):
+        rows = get_bulk_rows(request)
+        if not rows or len(rows) > app.config['BULK_MAX_ROWS']:
+            abort(422)
+
+        def referenced(key):
+            ids = set()
+            for row in rows:
+                if isinstance(row, dict):
+                    value = row.get(key)
+                    ids.update(value if isinstance(value, list) else [value])
+            return [i for i in ids if isinstance(i, int)]
+
+        category_ids = {category_id for (category_id,) in db.session.query(
+            Category.id).filter(Category.id.in_(referenced('category')))}
+        size_ids = {size_id for (size_id,) in db.session.query(
+            Size.id).filter(Size.id.in_(referenced('sizes')))}
+
+        results = []
+        valid_rows = []
+        seen_ids = set()
+        for index, row in enumerate(rows):
+            values, errors = validate_menu_item_row(
+                row, category_ids, size_ids)
+            if values is not None and values.get('id') is not None:
+                if values['id'] in seen_ids:
+                    errors.append('item_id is repeated in the batch')
+                seen_ids.add(values['id'])
+            results.append({'index': index, 'status': 'invalid',
+                            'errors': errors})
+            valid_rows.append(values)
+
+        if any(result['errors'] for result in results):
+            for result in results:
+                if not result['errors']:
+                    result['status'] = 'skipped'
+            return jsonify({
+                'success': False,
+                'error': 422,
+                'message': 'unprocessable',
+                'results': results
+            }), 422
+
+        try:
+            upserted = MenuItem.bulk_upsert(valid_rows)
+        except BaseException:
+            abort(500)
+        for result, row_result in zip(results, upserted):
+            del result['errors']
+            result.update(row_result)
+        return jsonify({
+            'success': True,
+            'created': sum(r['status'] == 'created' for r in upserted),
+            'updated': sum(r['status'] == 'updated' for r in upserted),
+            'results': results
+        })
+
+    @app.route('/batch', methods=["POST"])
+    @requires_auth(check=False)
+    def apply_batch_operations(jwt):
+        operations = request.get_json(silent=True)
+        if not isinstance(operations, list) or not operations or \
+                len(operations) > app.config['BATCH_MAX_OPERATIONS']:
+            abort(422)
+
+        results = [{'index': index, 'status': 'invalid',
+                    'errors': validate_operation(operation)}
+                   for index, operation in enumerate(operations)]
+        if not any(result['errors'] for result in results):
+            for operation in operations:
+                check_permissions(permission(operation), jwt)
+            try:
+                return jsonify({
+                    'success': True,
+                    'results': apply_batch(operations)
+                })
+            except BatchError as error:
+                results[error.index]['errors'].append(error.error)
+            except BaseException:
+                abort(500)
+
+        for result in results:
+            if not result['errors']:
+                result['status'] = 'skipped'
+        return jsonify({
+            'success': False,
+            'error': 422,
+            'message': 'unprocessable',
+            'results': results
+        }), 422
+
     @app.route('/menuitems/<int:item_id>', methods=["DELETE"])
     @requires_auth('delete:menu_item')
     def delete_menu_item(jwt, item_id):
         try:
-            item = MenuItem.query.filter(MenuItem.id == item_id).one_or_none()
+            item = MenuItem.query.filter(
+                MenuItem.id == item_id,
+                MenuItem.deleted_at.is_(None)).one_or_none()
             item.delete()
             return jsonify({
                 'success': True,
@@ -136,20 +669,21 @@ def create_app(test_config=None):
             abort(500)
 
     @app.route('/categories', methods=["GET"])
+    @response_cache.cached('categories')
+    @replica_read
     def get_categories():
-        paginated_categories = []
+        fields = get_fields(request, Category)
+        rows, total_categories, next_after = paginate(
+            request, Category.rows(fields=fields), Category.id)
         try:
-            categories = Category.query.order_by(Category.id).all()
-            paginated_categories = paginate(request, categories)
-            return jsonify({
+            return json_provider.response({
                 'success': True,
-                'categories': paginated_categories,
-                'total_categories': len(categories)
+                'categories': Category.format_rows(rows, fields),
+                'total_categories': total_categories,
+                'next_after': next_after
             })
         except BaseException:
             print(sys.exc_info())
-            if len(categories) or len(paginated_categories) == 0:
-                abort(404)
             abort(500)
 
     @app.route('/categories', methods=["POST"])
@@ -194,6 +728,168 @@ def create_app(test_config=None):
                 abort(404)
             abort(500)
 
+    @app.route('/categories/<int:category_id>/items', methods=["DELETE"])
+    @requires_auth('patch:category')
+    def clear_category_items(jwt, category_id):
+        category = Category.query.get(category_id)
+        if category is None:
+            abort(404)
+        try:
+            item_ids = category.clear_items()
+        except BaseException:
+            abort(500)
+        return jsonify({
+            'success': True,
+            'category_id': category_id,
+            'cleared': len(item_ids)
+        })
+
+    @app.route('/sizes', methods=["GET"])
+    @response_cache.cached('sizes')
+    @replica_read
+    def get_sizes():
+        rows, total_sizes, next_after = paginate(
+            request, Size.query.with_entities(Size.id, Size.name), Size.id)
+        return json_provider.response({
+            'success': True,
+            'sizes': [{'id': row.id, 'name': row.name} for row in rows],
+            'total_sizes': total_sizes,
+            'next_after': next_after
+        })
+
+    @app.route('/sizes', methods=["POST"])
+    @requires_auth('post:size')
+    def add_size(jwt):
+        data = request.get_json(silent=True) or {}
+        name = data.get('name')
+        if not isinstance(name, str) or not name:
+            abort(422)
+        try:
+            size = Size(name=name)
+            size.insert()
+            return jsonify({
+                'success': True,
+                'size': size.format()
+            })
+        except BaseException:
+            abort(500)
+
+    @app.route('/sizes/<int:size_id>', methods=["PATCH"])
+    @requires_auth('patch:size')
+    def edit_size(jwt, size_id):
+        data = request.get_json(silent=True) or {}
+        size = Size.query.get(size_id)
+        if size is None:
+            abort(404)
+        if 'name' in data:
+            if not isinstance(data['name'], str) or not data['name']:
+                abort(422)
+            size.name = data['name']
+        try:
+            update()
+            return jsonify({
+                'success': True,
+                'edited_size': size.format()
+            })
+        except BaseException:
+            abort(500)
+
+    @app.route('/sizes/<int:size_id>', methods=["DELETE"])
+    @requires_auth('delete:size')
+    def delete_size(jwt, size_id):
+        size = Size.query.get(size_id)
+        if size is None:
+            abort(404)
+        try:
+            size.delete()
+            return jsonify({
+                'success': True,
+                'deleted': size_id
+            })
+        except BaseException:
+            abort(500)
+
+    @app.route('/menuitems/<int:item_id>/sizes', methods=["PUT"])
+    @requires_auth('patch:menu_item')
+    def set_menu_item_sizes(jwt, item_id):
+        data = request.get_json(silent=True)
+        size_ids = data.get('sizes') if isinstance(data, dict) else None
+        if not isinstance(size_ids, list) or \
+                not all(is_integer(size_id) for size_id in size_ids):
+            abort(422)
+        size_ids = set(size_ids)
+        if db.session.query(MenuItem.id).filter(
+                MenuItem.id == item_id,
+                MenuItem.deleted_at.is_(None)).scalar() is None:
+            abort(404)
+        if size_ids and db.session.query(Size.id).filter(
+                Size.id.in_(size_ids)).count() != len(size_ids):
+            abort(422)
+        try:
+            added, removed = MenuItem.set_sizes(item_id, size_ids)
+        except BaseException:
+            abort(500)
+        return jsonify({
+            'success': True,
+            'menu_item_id': item_id,
+            'sizes': sorted(size_ids),
+            'added': added,
+            'removed': removed
+        })
+
+    @app.route('/changes', methods=["GET"])
+    @requires_auth('get:menu_items')
+    def get_changes(jwt):
+        since = request.args.get('since', 0, type=int)
+        limit = request.args.get('limit', app.config['MAX_PAGE_SIZE'],
+                                 type=int)
+        if since < 0 or limit < 1:
+            abort(422)
+        limit = min(limit, app.config['MAX_PAGE_SIZE'])
+        changes = ChangeLog.since(since, limit)
+        next_since = changes[-1].version if changes else since
+        latest_version = ChangeLog.latest_version()
+        return json_provider.response({
+            'success': True,
+            'changes': [change.format() for change in changes],
+            'next_since': next_since,
+            'latest_version': latest_version,
+            'more': next_since < latest_version
+        })
+
+    @app.route('/changes/stream', methods=["GET"])
+    @requires_auth('get:menu_items')
+    def stream_changes(jwt):
+        # a stream holds a sync worker for its whole length, only gevent
+        # workers turn it on (gunicorn.conf.py)
+        if not app.config['CHANGES_STREAM']:
+            raise ServiceUnavailable()
+        since = request.headers.get('Last-Event-ID', None, type=int)
+        if since is None:
+            since = request.args.get('since', None, type=int)
+        if since is None:
+            since = ChangeLog.latest_version()
+        if since < 0:
+            abort(422)
+        if change_feed.full():
+            raise ServiceUnavailable(
+                retry_after=app.config['CHANGES_HEARTBEAT_SECONDS'])
+
+        def generate():
+            yield 'retry: 1000\n\n'
+            for change in change_feed.stream(since):
+                if change is None:
+                    yield ': keepalive\n\n'
+                    continue
+                yield 'id: %d\nevent: change\ndata: ' % change.version
+                yield json_provider.dumps(change.format())
+                yield '\n\n'
+
+        return Response(stream_with_context(generate()),
+                        mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache',
+                                 'X-Accel-Buffering': 'no'})
+
     # Error Handling
 
     @app.errorhandler(401)
@@ -228,6 +924,14 @@ def create_app(test_config=None):
             "message": "unprocessable"
         }), 422
 
+    @app.errorhandler(429)
+    def too_many_requests(error):
+        return jsonify({
+            "success": False,
+            "error": 429,
+            "message": "too many requests"
+        }), 429, retry_after_header(error)
+
     @app.errorhandler(500)
     def internal_server_error(error):
         return jsonify({
@@ -236,6 +940,18 @@ def create_app(test_config=None):
             "message": "internal server error"
         }), 500
 
+    @app.errorhandler(503)
+    def service_unavailable(error):
+        return jsonify({
+            "success": False,
+            "error": 503,
+            "message": "service unavailable"
+        }), 503, retry_after_header(error)
+
+    if app.config['WARMUP']:
+        warmup(app, pages=(readme_page, api_reference_page),
+               connections=app.config['WARMUP_CONNECTIONS'])
+
     return app
 
 
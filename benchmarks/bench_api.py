@@ -0,0 +1,155 @@
+"""Latency and throughput of the read endpoints at several data sizes
+
+    python -m benchmarks.bench_api --sizes 100,1000,10000 \\
+        --output results.json [--baseline previous.json] [--database-url URL]
+
+For every size the database is rebuilt and seeded, the app is served from a
+threaded local server, and each endpoint is hit by `--concurrency` clients
+for `--duration` seconds. Tokens are signed by a local RSA key so no Auth0
+tenant is needed. With `--baseline` the p99 of every endpoint is compared to
+an earlier run and the command exits 1 if one grew by more than
+`--tolerance`.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from werkzeug.serving import make_server, WSGIRequestHandler
+
+from benchmarks.common import (
+    ALL_PERMISSIONS, bench_signing_key, make_app,
+    seed, run_load, use_local_keys
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def endpoints(items):
+    """name -> path of the endpoints measured with `items` seeded rows"""
+    middle = max(1, items // 2)
+    return {
+        'list': '/menuitems?limit=10',
+        'list_deep': '/menuitems?after=%d&limit=10' % max(0, items - 20),
+        'detail': '/menuitems/%d' % middle,
+        'search': '/menuitems/search?q=item+%d&limit=10' % middle,
+        'categories': '/categories',
+        'export': '/menuitems/export'
+    }
+
+
+def revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def serve(app):
+    server = make_server('127.0.0.1', 0, app, threaded=True,
+                         request_handler=QuietRequestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def run(database_url, sizes, concurrency, duration, only=None):
+    signing_key = bench_signing_key()
+    headers = signing_key.headers(ALL_PERMISSIONS)
+
+    results = {}
+    for items in sizes:
+        app = make_app(database_url)
+        use_local_keys(signing_key)
+        seed(app, items=items)
+        server = serve(app)
+        try:
+            base_url = 'http://127.0.0.1:%d' % server.server_port
+            results[str(items)] = {
+                name: run_load(base_url + path, headers, concurrency,
+                               duration)
+                for name, path in endpoints(items).items()
+                if only is None or name in only
+            }
+        finally:
+            server.shutdown()
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'revision': revision(),
+            'python': platform.python_version(),
+            'database': database_url.split(':', 1)[0],
+            'concurrency': concurrency,
+            'duration': duration
+        },
+        'results': results
+    }
+
+
+def regressions(current, baseline, tolerance):
+    """(size, endpoint, baseline p99, current p99) of the slowed endpoints"""
+    found = []
+    for size, by_endpoint in current['results'].items():
+        for name, result in by_endpoint.items():
+            before = baseline['results'].get(size, {}).get(name, {})
+            if 'p99_ms' not in before or 'p99_ms' not in result:
+                continue
+            if result['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+                found.append((size, name, before['p99_ms'],
+                              result['p99_ms']))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-url')
+    parser.add_argument('--sizes', default='100,1000,10000')
+    parser.add_argument('--endpoints',
+                        help='comma separated subset of: %s' % ', '.join(
+                            endpoints(0)))
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--output', default='bench-api.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'superburger-bench-api.db')
+    sizes = [int(size) for size in args.sizes.split(',')]
+    only = set(args.endpoints.split(',')) if args.endpoints else None
+
+    report = run(database_url, sizes, args.concurrency, args.duration, only)
+    for size, by_endpoint in report['results'].items():
+        for name, result in by_endpoint.items():
+            print('%7s %-11s %9.1f req/s  p50 %8.2fms  p99 %8.2fms  %d err'
+                  % (size, name, result.get('requests_per_second', 0),
+                     result.get('p50_ms', 0), result.get('p99_ms', 0),
+                     result['errors']))
+    with open(args.output, 'w') as output:
+        json.dump(report, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            slower = regressions(report, json.load(baseline), args.tolerance)
+        for size, name, before, after in slower:
+            print('REGRESSION %s items %s: p99 %.2fms -> %.2fms'
+                  % (size, name, before, after))
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
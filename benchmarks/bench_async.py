@@ -0,0 +1,97 @@
+"""Sync vs. gevent gunicorn workers under concurrent load
+
+    python -m benchmarks.bench_async --database-url postgres://... \\
+        --concurrency 50 --duration 10
+
+Each mode runs `gunicorn -c gunicorn.conf.py app:app` with the same number
+of workers. The gains come from overlapping I/O waits, so point it at a real
+Postgres (SQLite calls block the worker in both modes).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.request import urlopen
+
+from benchmarks.common import (
+    ALL_PERMISSIONS, bench_signing_key, make_app,
+    seed, run_load, write_jwks_file
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until_up(url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urlopen(url, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start: ' + url)
+
+
+def serve(worker_class, database_url, jwks_path, port, workers):
+    env = dict(os.environ,
+               DATABASE_URL=database_url,
+               JWKS_FILE=jwks_path,
+               WEB_WORKER_CLASS=worker_class,
+               WEB_CONCURRENCY=str(workers),
+               PORT=str(port),
+               RESPONSE_CACHE_BACKEND='none',
+               RATE_LIMIT_ENABLED='false')
+    return subprocess.Popen(
+        [sys.executable, '-c', 'from gunicorn.app.wsgiapp import run; run()',
+         '-c', 'gunicorn.conf.py', 'app:app'], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def run(database_url, items, concurrency, duration, workers, port):
+    signing_key = bench_signing_key()
+    jwks_path = write_jwks_file(signing_key)
+    seed(make_app(database_url), items=items)
+    headers = signing_key.headers(ALL_PERMISSIONS)
+
+    results = {}
+    try:
+        for worker_class in ('sync', 'gevent'):
+            server = serve(worker_class, database_url, jwks_path, port,
+                           workers)
+            try:
+                base_url = 'http://127.0.0.1:%d' % port
+                wait_until_up(base_url + '/api_reference')
+                results[worker_class] = run_load(
+                    base_url + '/menuitems?limit=20', headers,
+                    concurrency, duration)
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        os.remove(jwks_path)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-url')
+    parser.add_argument('--items', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'superburger-bench-async.db')
+    results = run(database_url, args.items, args.concurrency, args.duration,
+                  args.workers, args.port)
+    for worker_class, result in results.items():
+        print('%-7s %s' % (worker_class, json.dumps(result)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Single-item POST /menuitems (plus PUT /menuitems/<id>/sizes) vs. POST
+/menuitems/bulk, both writing the same items and item/size rows
+
+    python -m benchmarks.bench_bulk --rows 1000 [--database-url URL]
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.common import (
+    ALL_PERMISSIONS, bench_signing_key, make_app, seed, use_local_keys
+)
+
+
+def row(i):
+    return {'name': 'bulk item %d' % i, 'category': 1,
+            'description': 'benchmark item', 'ingredients': 'bread, beef',
+            'active': True, 'sizes': [1, 2]}
+
+
+def run(database_url, rows):
+    signing_key = bench_signing_key()
+    use_local_keys(signing_key)
+    headers = signing_key.headers(ALL_PERMISSIONS)
+
+    results = {}
+    for mode in ('single', 'bulk'):
+        app = make_app(database_url)
+        seed(app, items=0, categories=1, sizes=2)
+        client = app.test_client()
+        started = time.perf_counter()
+        if mode == 'single':
+            for i in range(rows):
+                res = client.post('/menuitems', json=row(i), headers=headers)
+                assert res.status_code == 200, res.data
+                # POST /menuitems takes no sizes, they are set separately
+                item_id = json.loads(res.data)['new_item']['id']
+                res = client.put('/menuitems/%d/sizes' % item_id,
+                                 json={'sizes': row(i)['sizes']},
+                                 headers=headers)
+                assert res.status_code == 200, res.data
+        else:
+            res = client.post('/menuitems/bulk', headers=headers,
+                              json=[row(i) for i in range(rows)])
+            assert res.status_code == 200, res.data
+        elapsed = time.perf_counter() - started
+        results[mode] = {'seconds': elapsed, 'rows_per_second': rows / elapsed}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(
+        tempfile.gettempdir(), 'superburger-bench-bulk.db')
+    results = run(database_url, args.rows)
+    for mode, result in results.items():
+        print('%-6s %8.3fs %10.1f rows/s' % (
+            mode, result['seconds'], result['rows_per_second']))
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
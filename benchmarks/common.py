@@ -0,0 +1,122 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+# the app module builds an app at import time, keep it off Postgres
+os.environ.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(
+    tempfile.gettempdir(), 'superburger-bench-import.db'))
+
+from app import create_app  # noqa: E402
+from benchmarks.signing import LocalSigningKey  # noqa: E402
+from src.auth import set_jwks_source  # noqa: E402
+from src.models import (  # noqa: E402
+    db, menu_items_sizes, MenuItem, MenuSnapshot, Category, Size
+)
+
+ALL_PERMISSIONS = (
+    'get:menu_items', 'get:item_details', 'post:menu_item',
+    'patch:menu_item', 'delete:menu_item', 'post:category', 'patch:category'
+)
+
+
+def bench_signing_key():
+    """2048-bit like Auth0's keys, so verifying a token costs what it does
+    in production"""
+    return LocalSigningKey(kid='bench-key', bits=2048)
+
+
+def make_app(database_url, **config):
+    """App on `database_url` with fresh tables, signing keys served locally"""
+    config.setdefault('RESPONSE_CACHE_BACKEND', 'none')
+    config.setdefault('RATE_LIMIT_ENABLED', False)
+    config['DATABASE_URL'] = database_url
+    app = create_app(config)
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+def use_local_keys(signing_key):
+    set_jwks_source(signing_key.jwks)
+
+
+def seed(app, items, categories=10, sizes=3):
+    with app.app_context():
+        all_sizes = [Size(name='size %d' % i) for i in range(sizes)]
+        all_categories = [Category(name='category %d' % i,
+                                   description='benchmark')
+                          for i in range(categories)]
+        db.session.add_all(all_sizes + all_categories)
+        db.session.flush()
+        rows = [{
+            'name': 'item %d' % i,
+            'category_id': all_categories[i % categories].id,
+            'description': 'benchmark item',
+            'ingredients': 'bread, beef, cheese',
+            'active': True
+        } for i in range(items)]
+        db.session.bulk_insert_mappings(MenuItem, rows, return_defaults=True)
+        pairs = [{'item_id': row['id'], 'size_id': size.id}
+                 for row in rows for size in all_sizes]
+        if pairs:
+            db.session.execute(menu_items_sizes.insert(), pairs)
+        MenuSnapshot.refresh_all()
+        db.session.commit()
+        db.session.remove()
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run_load(url, headers, concurrency, duration):
+    """Hits `url` from `concurrency` threads for `duration` seconds"""
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=headers), timeout=30) as res:
+                    res.read()
+            except (HTTPError, OSError) as error:
+                errors.append(str(error))
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return summarize(latencies, elapsed, len(errors))
+
+
+def summarize(latencies, elapsed, errors=0):
+    if not latencies:
+        return {'requests': 0, 'errors': errors}
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000
+    }
+
+
+def write_jwks_file(signing_key):
+    jwks_fd, jwks_path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(jwks_fd, 'w') as jwks_file:
+        json.dump(signing_key.jwks(), jwks_file)
+    return jwks_path
@@ -0,0 +1,38 @@
+import time
+
+import rsa
+from jose import jwk, jwt
+
+from src.auth import AUTH0_DOMAIN, API_AUDIENCE
+
+
+class LocalSigningKey:
+    """RSA key pair standing in for the Auth0 tenant in the offline tests and
+    benchmarks"""
+
+    def __init__(self, kid='local-test-key', bits=1024):
+        public_key, private_key = rsa.newkeys(bits)
+        self.kid = kid
+        self.private_pem = private_key.save_pkcs1().decode()
+        self.public_jwk = jwk.construct(
+            public_key.save_pkcs1().decode(), 'RS256').to_dict()
+        self.public_jwk.update(kid=kid, use='sig')
+
+    def jwks(self):
+        return {'keys': [self.public_jwk]}
+
+    def token(self, permissions=(), expires_in=3600, **claims):
+        claims.setdefault('sub', 'auth0|local-test-user')
+        claims.update({
+            'iss': 'https://' + AUTH0_DOMAIN + '/',
+            'aud': API_AUDIENCE,
+            'iat': int(time.time()),
+            'exp': int(time.time()) + expires_in,
+            'permissions': list(permissions)
+        })
+        return jwt.encode(claims, self.private_pem, algorithm='RS256',
+                          headers={'kid': self.kid})
+
+    def headers(self, permissions=(), **claims):
+        return {'Authorization': 'Bearer ' + self.token(permissions,
+                                                        **claims)}
@@ -0,0 +1,30 @@
+# gunicorn settings, `gunicorn -c gunicorn.conf.py app:app`
+#
+# WEB_WORKER_CLASS=gevent serves each worker's requests on greenlets, so a
+# request waiting on Postgres or on the Auth0 key fetch no longer blocks the
+# worker: the stdlib sockets used by urlopen are patched by the gevent worker
+# and psycopg2 is made cooperative below.
+import os
+
+bind = '0.0.0.0:' + os.getenv('PORT', '8000')
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+worker_class = os.getenv('WEB_WORKER_CLASS', 'sync')
+worker_connections = int(os.getenv('WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('WEB_TIMEOUT', 30))
+
+# each worker imports the app after forking, warming it up (signing keys,
+# pool connections, rendered pages) before it accepts its first request
+os.environ.setdefault('WARMUP', 'true')
+
+# change streams hold their request open: served by gevent workers only,
+# and closed before the worker timeout
+if worker_class == 'gevent':
+    os.environ.setdefault('CHANGES_STREAM', 'true')
+os.environ.setdefault('CHANGES_STREAM_SECONDS', str(max(1, timeout - 5)))
+
+
+def post_fork(server, worker):
+    database_url = os.getenv('DATABASE_URL', 'postgres')
+    if worker_class == 'gevent' and database_url.startswith('postgres'):
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -0,0 +1,58 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'categories',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'sizes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'menu_items',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('category_id', sa.Integer(), nullable=True),
+        sa.Column('description', sa.String(), nullable=False),
+        sa.Column('ingredients', sa.String(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'menu_items_sizes',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('size_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['item_id'], ['menu_items.id'], ),
+        sa.ForeignKeyConstraint(['size_id'], ['sizes.id'], ),
+        sa.PrimaryKeyConstraint('item_id', 'size_id')
+    )
+
+
+def downgrade():
+    op.drop_table('menu_items_sizes')
+    op.drop_table('menu_items')
+    op.drop_table('sizes')
+    op.drop_table('categories')
@@ -0,0 +1,48 @@
+"""menu item search indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# the weighted document of src.models.search_document() as of this
+# revision, copied so later model changes don't alter this migration
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(ingredients, '')), 'C')")
+
+
+def upgrade():
+    op.create_index('ix_menu_items_category_id_active', 'menu_items',
+                    ['category_id', 'active'])
+    op.create_index('ix_menu_items_sizes_size_id', 'menu_items_sizes',
+                    ['size_id'])
+
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite searches with LIKE, the filters above are all it indexes
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute('CREATE INDEX ix_menu_items_search ON menu_items '
+               'USING gin ((' + SEARCH_DOCUMENT + '))')
+    op.execute('CREATE INDEX ix_menu_items_name_trgm ON menu_items '
+               'USING gin (name gin_trgm_ops)')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_menu_items_name_trgm', table_name='menu_items')
+        op.drop_index('ix_menu_items_search', table_name='menu_items')
+    op.drop_index('ix_menu_items_sizes_size_id',
+                  table_name='menu_items_sizes')
+    op.drop_index('ix_menu_items_category_id_active',
+                  table_name='menu_items')
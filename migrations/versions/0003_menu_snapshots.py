@@ -0,0 +1,75 @@
+"""menu snapshots
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+# the tables as of this revision, the models may have moved on since
+categories = sa.table(
+    'categories', sa.column('id'), sa.column('name'),
+    sa.column('description'))
+sizes = sa.table('sizes', sa.column('id'), sa.column('name'))
+menu_items = sa.table(
+    'menu_items', sa.column('id'), sa.column('name'),
+    sa.column('category_id'), sa.column('description'),
+    sa.column('ingredients'), sa.column('active', sa.Boolean))
+menu_items_sizes = sa.table(
+    'menu_items_sizes', sa.column('item_id'), sa.column('size_id'))
+
+
+def upgrade():
+    snapshots = op.create_table(
+        'menu_snapshots',
+        sa.Column('item_id', sa.Integer(), nullable=False),
+        sa.Column('document', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('item_id')
+    )
+    connection = op.get_bind()
+
+    item_sizes = {}
+    for item_id, size_id, size_name in connection.execute(sa.select([
+            menu_items_sizes.c.item_id, sizes.c.id, sizes.c.name
+    ]).select_from(menu_items_sizes.join(
+        sizes, sizes.c.id == menu_items_sizes.c.size_id)).order_by(
+            menu_items_sizes.c.item_id, sizes.c.id)):
+        item_sizes.setdefault(item_id, []).append(
+            {'id': size_id, 'name': size_name})
+
+    rows = []
+    for row in connection.execute(sa.select([
+            menu_items, categories.c.name.label('category_name'),
+            categories.c.description.label('category_description')
+    ]).select_from(menu_items.outerjoin(
+            categories, categories.c.id == menu_items.c.category_id))):
+        category = row.category_id
+        if category is not None:
+            category = {'id': row.category_id, 'name': row.category_name,
+                        'description': row.category_description}
+        rows.append({'item_id': row.id, 'document': json.dumps({
+            'id': row.id,
+            'name': row.name,
+            'category': category,
+            'description': row.description,
+            'ingredients': row.ingredients,
+            'active': row.active,
+            'sizes': item_sizes.get(row.id, [])
+        }, sort_keys=True)})
+    if rows:
+        op.bulk_insert(snapshots, rows)
+
+
+def downgrade():
+    op.drop_table('menu_snapshots')
@@ -0,0 +1,55 @@
+"""menu item soft delete
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+# the tables as of this revision, the models may have moved on since
+menu_items = sa.table(
+    'menu_items', sa.column('id'), sa.column('active', sa.Boolean),
+    sa.column('deleted_at', sa.DateTime))
+menu_snapshots = sa.table('menu_snapshots', sa.column('item_id'))
+
+# MenuItem.LIVE, the rows customer facing reads are restricted to
+live = sa.and_(menu_items.c.deleted_at.is_(None),
+               menu_items.c.active == sa.true())
+deleted = menu_items.c.deleted_at.isnot(None)
+
+
+def upgrade():
+    op.add_column('menu_items',
+                  sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_menu_items_live', 'menu_items', ['id'],
+                    postgresql_where=live, sqlite_where=live)
+    op.create_index('ix_menu_items_live_category_id', 'menu_items',
+                    ['category_id', 'id'],
+                    postgresql_where=live, sqlite_where=live)
+    op.create_index('ix_menu_items_deleted_at', 'menu_items', ['deleted_at'],
+                    postgresql_where=deleted, sqlite_where=deleted)
+
+    # snapshots only hold live items from now on
+    op.execute(menu_snapshots.delete().where(
+        menu_snapshots.c.item_id.in_(
+            sa.select([menu_items.c.id]).where(sa.not_(live)))))
+
+
+def downgrade():
+    op.drop_index('ix_menu_items_deleted_at', table_name='menu_items')
+    op.drop_index('ix_menu_items_live_category_id', table_name='menu_items')
+    op.drop_index('ix_menu_items_live', table_name='menu_items')
+    # deleted items come back as regular ones, and the inactive items are
+    # missing from the snapshots until `python -m src.manage
+    # refresh_snapshots` runs
+    with op.batch_alter_table('menu_items') as batch_op:
+        batch_op.drop_column('deleted_at')
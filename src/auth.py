@@ -1,13 +1,52 @@
-import json
 from flask import request, _request_ctx_stack, abort
 from functools import wraps
 from jose import jwt
-from urllib.request import urlopen
 import os
+import time
+
+from src.jwks import JWKSCache, UrlJWKSSource, FileJWKSSource
+from src.token_cache import VerifiedTokenCache
+from src.metrics import record_auth_time
+from src.ratelimit import rate_limiter
 
 AUTH0_DOMAIN = os.getenv('AUTH0_DOMAIN', 'superburger.us.auth0.com')
 ALGORITHMS = ['RS256']
 API_AUDIENCE = os.getenv('API_AUDIENCE', 'superapi')
+JWKS_URL = os.getenv(
+    'JWKS_URL', "https://" + AUTH0_DOMAIN + "/.well-known/jwks.json")
+JWKS_FILE = os.getenv('JWKS_FILE')
+JWKS_CACHE_TTL = int(os.getenv('JWKS_CACHE_TTL', 600))
+JWKS_REFRESH_AHEAD = int(os.getenv('JWKS_REFRESH_AHEAD', 60))
+JWKS_FETCH_TIMEOUT = float(os.getenv('JWKS_FETCH_TIMEOUT', 5))
+TOKEN_CACHE_ENABLED = os.getenv('TOKEN_CACHE_ENABLED', 'true') == 'true'
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+
+# Signing keys
+
+
+def default_jwks_source():
+    if JWKS_FILE:
+        return FileJWKSSource(JWKS_FILE)
+    return UrlJWKSSource(JWKS_URL, timeout=JWKS_FETCH_TIMEOUT)
+
+
+jwks_cache = JWKSCache(default_jwks_source(),
+                       ttl=JWKS_CACHE_TTL,
+                       refresh_ahead=JWKS_REFRESH_AHEAD)
+
+
+def set_jwks_source(source):
+    """Swaps where signing keys come from, e.g. a local file in tests
+    """
+    jwks_cache.set_source(source)
+    token_cache.clear()
+
+
+# Verified tokens
+
+token_cache = VerifiedTokenCache(maxsize=TOKEN_CACHE_SIZE,
+                                 enabled=TOKEN_CACHE_ENABLED)
+
 
 # AuthError Exception
 
@@ -51,19 +90,12 @@ def check_permissions(permission, payload):
 
 
 def verify_decode_jwt(token):
-    jsonurl = urlopen("https://" + AUTH0_DOMAIN + "/.well-known/jwks.json")
-    jwks = json.loads(jsonurl.read())
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
     unverified_header = jwt.get_unverified_header(token)
-    rsa_key = {}
-    for key in jwks["keys"]:
-        if key["kid"] == unverified_header["kid"]:
-            rsa_key = {
-                "kty": key["kty"],
-                "kid": key["kid"],
-                "use": key["use"],
-                "n": key["n"],
-                "e": key["e"]
-            }
+    rsa_key = jwks_cache.get_key(unverified_header.get("kid"))
     if rsa_key:
         try:
             payload = jwt.decode(
@@ -73,6 +105,7 @@ def verify_decode_jwt(token):
                 audience=API_AUDIENCE,
                 issuer="https://" + AUTH0_DOMAIN + "/"
             )
+            token_cache.put(token, payload)
             return payload
         except jwt.ExpiredSignatureError:
             raise AuthError({"code": "token_expired",
@@ -89,13 +122,24 @@ def verify_decode_jwt(token):
                                  " token."}, 401)
 
 
-def requires_auth(permission=''):
+def requires_auth(permission='', check=True):
+    """Lets in tokens granted `permission`, or with check=False any valid
+    token, the view then checks the permissions itself
+    """
     def requires_auth_decorator(f):
         @wraps(f)
         def wrapper(*args, **kwargs):
+            started = time.perf_counter()
             token = get_token_auth_header()
+            verified_payload = token_cache.peek(token)
+            rate_limiter.check(verified_payload)
             payload = verify_decode_jwt(token)
-            check_permissions(permission, payload)
+            if verified_payload is None:
+                # only a verified `sub` is charged
+                rate_limiter.check_user(payload)
+            if check:
+                check_permissions(permission, payload)
+            record_auth_time(time.perf_counter() - started)
             return f(payload, *args, **kwargs)
 
         return wrapper
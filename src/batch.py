@@ -0,0 +1,157 @@
+from sqlalchemy import exc
+
+from src.models import unit_of_work, update, MenuItem, Category, Size
+
+'''
+Batch operations
+    a batch is a list of create/update/delete operations on menu items,
+    categories and sizes, applied in order in a single transaction
+        {"op": "create", "type": "category", "data": {"name": "Sides"}}
+        {"op": "update", "type": "menu_item", "id": 3,
+         "data": {"active": false}}
+        {"op": "delete", "type": "size", "id": 2}
+    the permission of an operation is `<post|patch|delete>:<type>`
+'''
+
+OPERATIONS = {'create': 'post', 'update': 'patch', 'delete': 'delete'}
+
+# type -> model, field of the operation data -> (column, accepted type)
+TYPES = {
+    'menu_item': (MenuItem, {
+        'name': ('name', str),
+        'category': ('category_id', int),
+        'description': ('description', str),
+        'ingredients': ('ingredients', str),
+        'active': ('active', bool),
+        'sizes': ('sizes', list)
+    }),
+    'category': (Category, {
+        'name': ('name', str),
+        'description': ('description', str)
+    }),
+    'size': (Size, {
+        'name': ('name', str)
+    })
+}
+
+REQUIRED = {
+    'menu_item': ('name', 'category', 'description', 'ingredients'),
+    'category': ('name',),
+    'size': ('name',)
+}
+
+DEFAULTS = {
+    'menu_item': {'active': True}
+}
+
+
+class BatchError(Exception):
+    def __init__(self, index, error):
+        self.index = index
+        self.error = error
+
+
+def permission(operation):
+    return '%s:%s' % (OPERATIONS[operation['op']], operation['type'])
+
+
+def validate_operation(operation):
+    '''the errors of an operation, empty when it can be applied'''
+    if not isinstance(operation, dict):
+        return ['operation is not a JSON object']
+    if operation.get('op') not in OPERATIONS:
+        return ['op must be one of create, update, delete']
+    if operation.get('type') not in TYPES:
+        return ['type must be one of menu_item, category, size']
+    errors = []
+    op, fields = operation['op'], TYPES[operation['type']][1]
+    item_id = operation.get('id')
+    if (item_id is not None or op != 'create') and \
+            (not isinstance(item_id, int) or isinstance(item_id, bool)):
+        errors.append('id must be an integer')
+    if op == 'delete':
+        return errors
+
+    data = operation.get('data')
+    if not isinstance(data, dict):
+        return errors + ['data must be a JSON object']
+    for field, value in data.items():
+        if field not in fields:
+            errors.append('unknown field ' + field)
+        elif not _is_a(value, fields[field][1]):
+            errors.append('%s must be a %s' % (
+                field, fields[field][1].__name__))
+    if op == 'create':
+        errors += [field + ' is required'
+                   for field in REQUIRED[operation['type']]
+                   if not data.get(field)]
+    sizes = data.get('sizes')
+    if isinstance(sizes, list) and \
+            not all(_is_a(size_id, int) for size_id in sizes):
+        errors.append('sizes must be a list of size ids')
+    return errors
+
+
+def _is_a(value, kind):
+    # JSON booleans are not integers
+    return isinstance(value, kind) and \
+        (kind is bool or not isinstance(value, bool))
+
+
+def apply_batch(operations):
+    '''
+    applies validated operations in one transaction, returns the type, op
+    and id of each. Raises BatchError on the first operation that can't be
+    applied, nothing is written then.
+    '''
+    results = []
+    with unit_of_work():
+        for index, operation in enumerate(operations):
+            try:
+                obj = apply_operation(operation)
+            except BatchError as error:
+                error.index = index
+                raise
+            except exc.IntegrityError:
+                raise BatchError(index, 'conflicts with existing rows')
+            results.append({'index': index, 'op': operation['op'],
+                            'type': operation['type'], 'id': obj.id})
+    return results
+
+
+def apply_operation(operation):
+    model, fields = TYPES[operation['type']]
+    op = operation['op']
+    if op == 'create':
+        obj = model(id=operation.get('id'),
+                    **DEFAULTS.get(operation['type'], {}))
+    else:
+        obj = model.query.get(operation['id'])
+        if obj is None or getattr(obj, 'deleted_at', None) is not None:
+            raise BatchError(None, '%s %d does not exist' % (
+                operation['type'], operation['id']))
+    if op == 'delete':
+        obj.delete()
+        return obj
+
+    for field, value in operation['data'].items():
+        column = fields[field][0]
+        if column == 'category_id' and Category.query.get(value) is None:
+            raise BatchError(None, 'category does not exist')
+        if column == 'sizes':
+            value = _sizes(value)
+        setattr(obj, column, value)
+    if op == 'create':
+        obj.insert()
+    else:
+        update()
+    return obj
+
+
+def _sizes(size_ids):
+    size_ids = list(dict.fromkeys(size_ids))
+    sizes = Size.query.filter(Size.id.in_(size_ids)).all() \
+        if size_ids else []
+    if len(sizes) != len(size_ids):
+        raise BatchError(None, 'sizes must be a list of existing size ids')
+    return sizes
@@ -0,0 +1,247 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import request, make_response, current_app, g
+
+from src.models import on_tables_changed
+
+logger = logging.getLogger(__name__)
+
+'''
+Cache backends
+    - LRUBackend: in-process, one cache per worker
+    - RedisBackend: wraps any client with the redis-py get/set/mget/incr
+      interface so every worker shares entries and invalidations
+    counters hold the per-table generations, they start from a timestamp so
+    a restarted backend never hands out generations it used before
+'''
+
+
+class LRUBackend:
+    shared = False
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def counters(self, keys):
+        with self._lock:
+            return [self._counters.setdefault(key, time.time_ns())
+                    for key in keys]
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = \
+                self._counters.setdefault(key, time.time_ns()) + 1
+            return self._counters[key]
+
+
+class RedisBackend:
+    shared = True
+
+    def __init__(self, client, prefix='superburger:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value, ttl=None):
+        self.client.set(self.prefix + key, value, ex=ttl or None)
+
+    def counters(self, keys):
+        keys = [self.prefix + key for key in keys]
+        values = self.client.mget(keys)
+        for i, value in enumerate(values):
+            if value is None:
+                self.client.set(keys[i], time.time_ns(), nx=True)
+                values[i] = self.client.get(keys[i])
+        return [int(value) for value in values]
+
+    def incr(self, key):
+        key = self.prefix + key
+        self.client.set(key, time.time_ns(), nx=True)
+        return self.client.incr(key)
+
+
+def content_etag(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+def backend_from_config(config):
+    name = config['RESPONSE_CACHE_BACKEND']
+    if name == 'memory':
+        return LRUBackend(config['RESPONSE_CACHE_SIZE'])
+    if name == 'redis':
+        import redis
+        return RedisBackend(redis.Redis.from_url(config['REDIS_URL']))
+    return None
+
+
+'''
+ResponseCache
+    read-through cache of JSON responses keyed by route, query arguments and
+    the generations of the tables the route reads. A commit touching one of
+    those tables bumps its generation so later lookups miss.
+    Generations kept in-process are not seen by the other workers, so with an
+    unshared backend keys also roll over every `ttl` seconds.
+    ETags, and If-None-Match requests answered with a 304:
+    - shared backend: the key itself, a 304 costs the generations alone
+    - otherwise a hash of the body, stored along with it, so every worker
+      gives the same content the same ETag for as long as it is unchanged
+    Responses read from a lagging replica may predate the generations of
+    their key, they are neither stored nor given an ETag.
+'''
+
+
+class ResponseCache:
+    def __init__(self, backend=None, ttl=60):
+        self.ttl = ttl
+        self.set_backend(backend)
+
+    def init_app(self, app):
+        self.ttl = app.config['RESPONSE_CACHE_TTL']
+        self.set_backend(backend_from_config(app.config))
+
+    def set_backend(self, backend):
+        self.backend = backend
+        # generations are still needed for ETags when caching is off
+        self.versions = backend if backend is not None else LRUBackend(0)
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.errors = 0
+
+    def generations(self, tables):
+        return self.versions.counters(['gen:' + table for table in tables])
+
+    def invalidate(self, tables):
+        for table in tables:
+            try:
+                self.versions.incr('gen:' + table)
+            except Exception:
+                self.errors += 1
+                logger.warning("response cache invalidation of %s failed",
+                               table, exc_info=True)
+
+    def key(self, tables):
+        args = urlencode(sorted(request.args.items(multi=True)))
+        generations = [str(gen) for gen in self.generations(tables)]
+        if not self.versions.shared and self.ttl:
+            generations.append(str(int(time.time() // self.ttl)))
+        raw = '%s?%s|%s' % (request.path, args, ','.join(generations))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def cached(self, *tables):
+        '''
+        caches the 200 responses of a route reading from `tables` and
+        answers If-None-Match requests for them
+        '''
+        def cached_decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                try:
+                    key = self.key(tables)
+                except Exception:
+                    self.errors += 1
+                    logger.warning("response cache lookup failed",
+                                   exc_info=True)
+                    return f(*args, **kwargs)
+
+                by_key = self.versions.shared
+                if by_key and request.if_none_match.contains(key):
+                    return self.not_modified_response(key)
+
+                entry = None
+                if self.backend is not None:
+                    try:
+                        entry = self.backend.get('resp:' + key)
+                    except Exception:
+                        self.errors += 1
+                        logger.warning("response cache lookup failed",
+                                       exc_info=True)
+
+                if entry is not None:
+                    etag, body = (key, entry) if by_key else entry
+                    if request.if_none_match.contains(etag):
+                        return self.not_modified_response(etag)
+                    self.hits += 1
+                    response = current_app.response_class(
+                        body, mimetype='application/json')
+                    response.headers['X-Cache'] = 'HIT'
+                    response.set_etag(etag)
+                    return response
+
+                self.misses += 1
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or \
+                        response.direct_passthrough or g.get('replica_used'):
+                    return response
+                body = response.get_data()
+                etag = key if by_key else content_etag(body)
+                if self.backend is not None:
+                    try:
+                        self.backend.set('resp:' + key,
+                                         body if by_key else (etag, body),
+                                         self.ttl)
+                    except Exception:
+                        self.errors += 1
+                        logger.warning("response cache store failed",
+                                       exc_info=True)
+                    response.headers['X-Cache'] = 'MISS'
+                if request.if_none_match.contains(etag):
+                    return self.not_modified_response(etag)
+                response.set_etag(etag)
+                return response
+
+            return wrapper
+
+        return cached_decorator
+
+    def not_modified_response(self, etag):
+        self.not_modified += 1
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__ if self.backend else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+
+response_cache = ResponseCache()
+on_tables_changed(response_cache.invalidate)
@@ -0,0 +1,129 @@
+import logging
+import select
+import threading
+import time
+
+from src.models import CHANGES_CHANNEL, ChangeLog, db, on_tables_changed
+
+logger = logging.getLogger(__name__)
+
+'''
+ChangeFeed
+    wakes the open change streams of this worker when the change log grows
+    - commits made by this worker wake them right away
+    - on Postgres a background thread LISTENs to the notifications sent by
+      the commits of every worker
+    - otherwise (SQLite, or the listener down) the streams look for
+      changes at every heartbeat
+    `max_streams` caps the streams a worker keeps open
+'''
+
+
+class ChangeFeed:
+    def __init__(self):
+        self.heartbeat_seconds = 15
+        self.stream_seconds = 300
+        self.max_streams = 100
+        self.streams = 0
+        self.generation = 0
+        self._condition = threading.Condition()
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def init_app(self, app):
+        self.heartbeat_seconds = app.config['CHANGES_HEARTBEAT_SECONDS']
+        self.stream_seconds = app.config['CHANGES_STREAM_SECONDS']
+        self.max_streams = app.config['CHANGES_MAX_STREAMS']
+        if app.config['CHANGES_LISTEN']:
+            with app.app_context():
+                engine = db.engine
+            # the dialect, postgres:// URLs name their backend 'postgres'
+            if engine.dialect.name == 'postgresql':
+                self.listen(engine.url)
+
+    def notify(self):
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+
+    def wait(self, generation, timeout):
+        '''
+        blocks until a change newer than `generation` or `timeout` seconds,
+        returns the current generation
+        '''
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.generation != generation, timeout)
+            return self.generation
+
+    def tables_changed(self, tables):
+        if ChangeLog.__tablename__ in tables:
+            self.notify()
+
+    def full(self):
+        return self.streams >= self.max_streams
+
+    def stream(self, since, limit=100):
+        '''
+        yields the changes after version `since` as they are committed, and
+        None every `heartbeat_seconds` without any, for `stream_seconds`
+        '''
+        with self._lock:
+            self.streams += 1
+        try:
+            deadline = time.monotonic() + self.stream_seconds
+            while True:
+                generation = self.generation
+                changes = ChangeLog.since(since, limit)
+                # the connection goes back to the pool while waiting
+                db.session.remove()
+                for change in changes:
+                    since = change.version
+                    yield change
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                if len(changes) == limit:
+                    continue
+                if self.wait(generation, min(
+                        self.heartbeat_seconds, remaining)) == generation:
+                    yield None
+        finally:
+            with self._lock:
+                self.streams -= 1
+
+    def listen(self, url):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        self._listener = threading.Thread(
+            target=self._listen, args=(url,), name='changes-listener',
+            daemon=True)
+        self._listener.start()
+
+    def _listen(self, url):
+        import psycopg2
+        while True:
+            connection = None
+            try:
+                connection = psycopg2.connect(**url.translate_connect_args(
+                    username='user', database='dbname'), **url.query)
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    cursor.execute('LISTEN ' + CHANGES_CHANNEL)
+                while True:
+                    if select.select([connection], [], [],
+                                     self.heartbeat_seconds)[0]:
+                        connection.poll()
+                        if connection.notifies:
+                            connection.notifies.clear()
+                            self.notify()
+            except Exception:
+                logger.warning("change notifications lost, retrying",
+                               exc_info=True)
+                if connection is not None:
+                    connection.close()
+                time.sleep(self.heartbeat_seconds)
+
+
+change_feed = ChangeFeed()
+on_tables_changed(change_feed.tables_changed)
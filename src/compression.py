@@ -0,0 +1,101 @@
+import gzip
+import re
+
+from flask import request
+
+from src.cache import LRUBackend
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+BROTLI_QUALITY = 4
+# an ETag sent back for a compressed body, `"<etag>-gzip"`
+ENCODED_ETAG = re.compile(r'-(?:br|gzip)"')
+
+'''
+Compressor
+    compresses the JSON responses of clients that accept it
+    - brotli when the `brotli` package is installed and the client prefers
+      or equally accepts it, gzip otherwise
+    - bodies under `min_size` bytes are sent as they are, compressing them
+      costs more than it saves
+    - streamed responses (the export) are left alone
+    - the compressed body of a response with an ETag is kept in a small LRU,
+      so cached and unchanged responses are only compressed once
+    A compressed body gets its own ETag, `<etag>-<encoding>`. The suffix is
+    stripped from If-None-Match before the views see it so conditional
+    requests keep matching.
+'''
+
+
+class Compressor:
+    def __init__(self):
+        self.enabled = False
+        self.min_size = 1024
+        self.level = 6
+        self.mimetypes = {'application/json'}
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+        self._cache = LRUBackend(256)
+
+    def init_app(self, app):
+        self.enabled = app.config['COMPRESSION']
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        self._cache = LRUBackend(app.config['COMPRESS_CACHE_SIZE'])
+        app.before_request(self.strip_encoded_etags)
+        app.after_request(self.compress)
+
+    def negotiate(self):
+        '''the accepted encoding with the highest quality, None if none'''
+        best, best_quality = None, 0
+        for encoding in self.encodings:
+            quality = request.accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def strip_encoded_etags(self):
+        if_none_match = request.environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            request.environ['HTTP_IF_NONE_MATCH'] = ENCODED_ETAG.sub(
+                '"', if_none_match)
+
+    def compress(self, response):
+        if not self.enabled or response.status_code != 200 or \
+                response.direct_passthrough or response.is_streamed or \
+                response.mimetype not in self.mimetypes or \
+                'Content-Encoding' in response.headers:
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        compressed = None
+        if etag is not None:
+            etag = '%s-%s' % (etag, encoding)
+            compressed = self._cache.get(etag)
+        if compressed is None:
+            compressed = self._encode(body, encoding)
+            if etag is not None:
+                self._cache.set(etag, compressed)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        if etag is not None:
+            response.set_etag(etag, weak)
+        return response
+
+    def _encode(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=BROTLI_QUALITY)
+        return gzip.compress(body, compresslevel=self.level)
+
+
+compressor = Compressor()
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+
+from sqlalchemy.orm import configure_mappers
+
+from src.auth import jwks_cache
+from src.models import db, replicas
+
+logger = logging.getLogger(__name__)
+
+'''
+Readiness checks
+    each check runs in its own daemon thread and is given up on after
+    `timeout` seconds, so a hung database or IdP makes the probe fail fast
+    instead of hanging it
+'''
+
+
+def run_with_timeout(check, timeout):
+    '''returns (ok, detail, elapsed ms) of `check()`'''
+    result = {}
+
+    def target():
+        try:
+            result['detail'] = check()
+            result['ok'] = True
+        except Exception as error:
+            result['detail'] = '%s: %s' % (type(error).__name__, error)
+            result['ok'] = False
+
+    started = time.perf_counter()
+    thread = threading.Thread(target=target, name='readiness-check',
+                              daemon=True)
+    thread.start()
+    thread.join(timeout)
+    elapsed = round((time.perf_counter() - started) * 1000, 1)
+    if thread.is_alive():
+        return False, 'timed out after %ss' % timeout, elapsed
+    return result['ok'], result['detail'], elapsed
+
+
+def check_database(app):
+    with app.app_context():
+        with db.engine.connect() as connection:
+            connection.scalar('SELECT 1')
+    return None
+
+
+def check_jwks():
+    if not jwks_cache.keys:
+        jwks_cache.refresh()
+    return {'keys': len(jwks_cache.keys), 'fresh': jwks_cache.is_fresh()}
+
+
+def readiness(app, timeout):
+    '''
+    the state of the dependencies a request needs, and whether all of them
+    are available: the primary database and the signing keys. Stale keys
+    are still usable, replicas are reported but never fail the check since
+    reads fall back to the primary
+    '''
+    checks = {}
+    for name, check in (('database', lambda: check_database(app)),
+                        ('jwks', check_jwks)):
+        ok, detail, elapsed = run_with_timeout(check, timeout)
+        checks[name] = {'ok': ok, 'ms': elapsed}
+        if isinstance(detail, dict):
+            checks[name].update(detail)
+        elif detail is not None:
+            checks[name]['error'] = detail
+    if replicas:
+        checks['replicas'] = replicas.stats()
+    ready = all(check.get('ok', True) for check in checks.values())
+    return ready, checks
+
+
+'''
+warmup(app, pages)
+    does the work the first requests of a fresh worker would otherwise pay
+    for: fetching the signing keys, opening pool connections, configuring
+    the ORM mappers and rendering the static pages. Every step is best
+    effort, a failure is logged and the worker starts anyway.
+'''
+
+
+def warmup(app, pages=(), connections=1, timeout=5):
+    started = time.perf_counter()
+    steps = [
+        ('signing keys', check_jwks),
+        ('mappers', configure_mappers),
+        ('database connections', lambda: _open_connections(app,
+                                                           connections)),
+    ]
+    steps += [('page ' + page.path, page.render) for page in pages]
+    for name, step in steps:
+        ok, detail, elapsed = run_with_timeout(step, timeout)
+        if ok:
+            logger.info("warmup: %s ready in %.1fms", name, elapsed)
+        else:
+            logger.warning("warmup: %s failed after %.1fms: %s", name,
+                           elapsed, detail)
+    logger.info("warmup done in %.1fms",
+                (time.perf_counter() - started) * 1000)
+
+
+def _open_connections(app, count):
+    # connections checked out together and returned stay in the pool
+    with app.app_context():
+        engines = [db.engine] + list(replicas.engines)
+        opened = []
+        try:
+            for engine in engines:
+                for _ in range(count if engine is db.engine else 1):
+                    opened.append(engine.connect())
+            for connection in opened:
+                connection.scalar('SELECT 1')
+        finally:
+            for connection in opened:
+                connection.close()
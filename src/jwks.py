@@ -0,0 +1,152 @@
+import json
+import logging
+import threading
+import time
+from urllib.request import urlopen
+
+logger = logging.getLogger(__name__)
+
+'''
+JWKS sources
+    callables returning the parsed JSON Web Key Set ({"keys": [...]})
+'''
+
+
+class UrlJWKSSource:
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self):
+        with urlopen(self.url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+class FileJWKSSource:
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self):
+        with open(self.path, "r") as jwks_file:
+            return json.load(jwks_file)
+
+
+'''
+JWKSCache
+    in-process signing key store keyed by kid
+    - keys are reused for `ttl` seconds
+    - from `refresh_ahead` seconds before expiry, and after it, the keys
+      keep being served while a background refresh fetches new ones
+    - an unknown kid triggers a single-flight refetch
+    - once keys are loaded, fetches are throttled to one every
+      `min_refetch_interval` seconds so random kids or a down IdP can't
+      turn every request into a fetch
+    - if a fetch fails the previously fetched (stale) keys keep being served
+    - without any keys the first request fetches them and the others wait
+      for it, a failed fetch fails them all instead of being repeated by
+      each
+'''
+
+
+class JWKSCache:
+    def __init__(self, source, ttl=600, refresh_ahead=60,
+                 min_refetch_interval=10):
+        self.source = source
+        self.ttl = ttl
+        self.refresh_ahead = refresh_ahead
+        self.min_refetch_interval = min_refetch_interval
+        self._keys = {}
+        self._expires_at = 0
+        self._last_attempt = None
+        self._last_error = None
+        self._attempts = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._background = None
+
+    def set_source(self, source):
+        with self._lock:
+            self.source = source
+            self._keys = {}
+            self._expires_at = 0
+            self._last_attempt = None
+            self._last_error = None
+            self._generation += 1
+
+    @property
+    def keys(self):
+        return dict(self._keys)
+
+    def is_fresh(self):
+        return bool(self._keys) and time.monotonic() < self._expires_at
+
+    def get_key(self, kid):
+        now = time.monotonic()
+        if not self._keys:
+            self.refresh()
+        elif now >= self._expires_at - self.refresh_ahead:
+            self._refresh_in_background()
+
+        key = self._keys.get(kid)
+        if key is None and kid is not None:
+            self.refresh(unknown_kid=kid)
+            key = self._keys.get(kid)
+        return key
+
+    def refresh(self, unknown_kid=None):
+        generation = self._generation
+        attempts = self._attempts
+        with self._lock:
+            # the fetch we waited for found no keys
+            if not self._keys and self._attempts != attempts and \
+                    self._last_error is not None:
+                raise self._last_error
+            # another thread refreshed while we were waiting for the lock
+            if self._generation != generation and self._keys:
+                if unknown_kid is None or unknown_kid in self._keys:
+                    return
+            now = time.monotonic()
+            if self._keys and self._recently_attempted(now):
+                return
+            self._fetch(now)
+
+    def _recently_attempted(self, now):
+        return self._last_attempt is not None and \
+            now - self._last_attempt < self.min_refetch_interval
+
+    def _fetch(self, now):
+        self._last_attempt = now
+        try:
+            jwks = self.source()
+            keys = {}
+            for key in jwks["keys"]:
+                keys[key["kid"]] = {
+                    "kty": key["kty"],
+                    "kid": key["kid"],
+                    "use": key.get("use", "sig"),
+                    "n": key["n"],
+                    "e": key["e"]
+                }
+        except Exception as error:
+            self._attempts += 1
+            self._last_error = error
+            if not self._keys:
+                raise
+            logger.warning("JWKS fetch failed, serving stale keys",
+                           exc_info=True)
+            return
+        self._attempts += 1
+        self._last_error = None
+        self._keys = keys
+        self._expires_at = now + self.ttl
+        self._generation += 1
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._recently_attempted(time.monotonic()):
+                return
+            if self._background is not None and self._background.is_alive():
+                return
+            self._background = threading.Thread(
+                target=self.refresh, name="jwks-refresh", daemon=True)
+            self._background.start()
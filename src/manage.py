@@ -1,8 +1,8 @@
-from flask_script import Manager
-from flask_migrate import Migrate, MigrateCommand
+from flask_script import Command, Manager
+from flask_migrate import Migrate, MigrateCommand, stamp
 
 from app import app
-from models import db
+from src.models import db, create_schema, MenuSnapshot
 
 migrate = Migrate(app, db)
 manager = Manager(app)
@@ -10,5 +10,28 @@ manager = Manager(app)
 manager.add_command('db', MigrateCommand)
 
 
+class InitDb(Command):
+    """Creates the tables of a fresh database and marks it as migrated"""
+
+    def run(self):
+        create_schema(app)
+        stamp()
+
+
+class RefreshSnapshots(Command):
+    """Rebuilds the menu snapshot of every item"""
+
+    def run(self):
+        count = MenuSnapshot.refresh_all()
+        db.session.commit()
+        print('refreshed %d menu item snapshots' % count)
+
+
+# Command subclasses, @manager.command relies on inspect.getargspec which
+# Python 3.11 removed
+manager.add_command('init_db', InitDb)
+manager.add_command('refresh_snapshots', RefreshSnapshots)
+
+
 if __name__ == '__main__':
     manager.run()
@@ -0,0 +1,191 @@
+import logging
+import threading
+import time
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+'''
+Metric types
+    minimal thread safe counters and histograms rendered in the Prometheus
+    text exposition format, values are per process (per gunicorn worker)
+'''
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"')) for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.description),
+                 '# TYPE %s counter' % self.name]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append('%s%s %s' % (
+                    self.name, _labels(self.labelnames, key), value))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, description, labelnames=(),
+                 buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            series = self._values.setdefault(
+                key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.description),
+                 '# TYPE %s histogram' % self.name]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append('%s_bucket%s %d' % (
+                        self.name, _labels(self.labelnames, key,
+                                           [('le', bound)]), bucket_count))
+                lines.append('%s_bucket%s %d' % (
+                    self.name, _labels(self.labelnames, key, [('le', '+Inf')]),
+                    count))
+                labels = _labels(self.labelnames, key)
+                lines.append('%s_sum%s %s' % (self.name, labels, total))
+                lines.append('%s_count%s %d' % (self.name, labels, count))
+        return lines
+
+
+'''
+Metrics
+    per-route latency, database queries and auth time of every request
+    - start_request / end_request are wired to before/after_request
+    - SQL statements are timed by engine listeners and attributed to the
+      current request
+    - collectors are callables returning {name: value} of extra counters
+'''
+
+
+class Metrics:
+    def __init__(self):
+        self.collectors = []
+        self.slow_request_seconds = 0
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter(
+            'superburger_requests_total', 'Requests served',
+            ('method', 'route', 'status'))
+        self.latency = Histogram(
+            'superburger_request_duration_seconds', 'Request latency',
+            ('method', 'route'))
+        self.db_queries = Histogram(
+            'superburger_request_db_queries', 'SQL statements per request',
+            ('method', 'route'), buckets=QUERY_COUNT_BUCKETS)
+        self.db_time = Histogram(
+            'superburger_request_db_seconds', 'Time spent in SQL per request',
+            ('method', 'route'))
+        self.auth_time = Histogram(
+            'superburger_auth_seconds', 'Token verification time',
+            ('route',))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = []
+        g.metrics_auth_seconds = None
+
+    def end_request(self, request, response):
+        started = getattr(g, 'metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        queries = g.metrics_queries
+        db_seconds = sum(duration for _, duration in queries)
+
+        self.requests.inc(method=request.method, route=route,
+                          status=response.status_code)
+        self.latency.observe(elapsed, method=request.method, route=route)
+        self.db_queries.observe(len(queries), method=request.method,
+                                route=route)
+        self.db_time.observe(db_seconds, method=request.method, route=route)
+        if g.metrics_auth_seconds is not None:
+            self.auth_time.observe(g.metrics_auth_seconds, route=route)
+
+        if self.slow_request_seconds and elapsed >= self.slow_request_seconds:
+            logger.warning(
+                "slow request %s %s %d in %.1fms (%d queries, %.1fms in db)"
+                "%s", request.method, request.full_path.rstrip('?'),
+                response.status_code, elapsed * 1000, len(queries),
+                db_seconds * 1000, ''.join(
+                    '\n  %.1fms %s' % (duration * 1000, statement)
+                    for statement, duration in queries))
+
+    def render(self):
+        lines = []
+        for metric in (self.requests, self.latency, self.db_queries,
+                       self.db_time, self.auth_time):
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, value in sorted(collector().items()):
+                lines.append('# TYPE %s gauge' % name)
+                lines.append('%s %s' % (name, value))
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def record_auth_time(seconds):
+    if has_request_context():
+        g.metrics_auth_seconds = seconds
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _start_query_timer(conn, cursor, statement, parameters, context,
+                       executemany):
+    conn.info.setdefault('metrics_query_started', []).append(
+        time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_query_started'].pop()
+    if has_request_context() and hasattr(g, 'metrics_queries'):
+        g.metrics_queries.append((statement, time.perf_counter() - started))
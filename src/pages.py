@@ -0,0 +1,42 @@
+import hashlib
+import os
+import threading
+from datetime import datetime, timezone
+
+import markdown
+from flask import make_response
+
+'''
+MarkdownPage
+    a markdown file rendered to HTML once and kept in memory,
+    re-rendered only when the file's mtime changes
+'''
+
+
+class MarkdownPage:
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._html = None
+        self._etag = None
+        self._lock = threading.Lock()
+
+    def render(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    with open(self.path, "r") as md_file:
+                        html = markdown.markdown(md_file.read())
+                    self._html = html
+                    self._etag = hashlib.sha1(html.encode()).hexdigest()
+                    self._mtime = mtime
+        return self._html, self._etag, self._mtime
+
+    def response(self, request):
+        html, etag, mtime = self.render()
+        response = make_response(html)
+        response.set_etag(etag)
+        response.last_modified = datetime.fromtimestamp(
+            mtime / 1e9, tz=timezone.utc)
+        return response.make_conditional(request)
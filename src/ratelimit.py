@@ -0,0 +1,241 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from flask import request, g
+from werkzeug.exceptions import TooManyRequests, ServiceUnavailable
+
+logger = logging.getLogger(__name__)
+
+'''
+Token bucket backends
+    take(key, rate, burst) spends one token of the bucket `key`, which holds
+    up to `burst` tokens and refills at `rate` tokens a second. It returns
+    whether a token was available and the seconds until the next one is.
+    - MemoryBuckets: in-process, each worker limits on its own
+    - RedisBuckets: one bucket per key shared by all workers, updated
+      atomically by a Lua script
+'''
+
+
+class MemoryBuckets:
+    shared = False
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, 0 if allowed else (1 - tokens) / rate
+
+
+TAKE_SCRIPT = '''
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HMSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+'''
+
+
+class RedisBuckets:
+    shared = True
+
+    def __init__(self, client, prefix='superburger:rate:'):
+        self.prefix = prefix
+        self._take = client.register_script(TAKE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self._take(keys=[self.prefix + key],
+                                     args=[rate, burst, time.time()])
+        tokens = float(tokens)
+        return bool(allowed), 0 if allowed else (1 - tokens) / rate
+
+
+def buckets_from_config(config):
+    if config['RATE_LIMIT_BACKEND'] == 'redis':
+        import redis
+        return RedisBuckets(redis.Redis.from_url(config['REDIS_URL']))
+    return MemoryBuckets(config['RATE_LIMIT_MAX_KEYS'])
+
+
+'''
+RateLimiter
+    limits the requests of each client, before their token is verified
+    when possible, so a flood costs a bucket lookup instead of an RSA
+    verification
+    - by IP, which a client can't fake, on every authenticated request
+    - by the token's `sub`, only once it is verified: tokens already in
+      the verified token cache are charged before verification, others
+      right after it. A forged token naming someone else's `sub` never
+      touches that user's bucket.
+    a failing shared backend lets requests through rather than rejecting
+    them all
+'''
+
+
+class RateLimiter:
+    def __init__(self):
+        self.enabled = False
+        self.limited = 0
+        self.errors = 0
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config['RATE_LIMIT_ENABLED']
+        self.rate = config['RATE_LIMIT_PER_SECOND']
+        self.burst = config['RATE_LIMIT_BURST']
+        self.ip_rate = config['RATE_LIMIT_IP_PER_SECOND']
+        self.ip_burst = config['RATE_LIMIT_IP_BURST']
+        self.trusted_proxies = config['RATE_LIMIT_TRUSTED_PROXIES']
+        self.buckets = buckets_from_config(config) if self.enabled else None
+        self.limited = 0
+        self.errors = 0
+
+    def client_ip(self):
+        '''
+        the address of the client, `trusted_proxies` hops before us when
+        the app runs behind proxies appending to X-Forwarded-For
+        '''
+        route = request.access_route
+        if self.trusted_proxies and len(route) >= self.trusted_proxies:
+            return route[-self.trusted_proxies]
+        return request.remote_addr
+
+    def check(self, verified_payload=None):
+        '''
+        aborts with 429 when the client ran out of requests: charges its IP
+        and, given the payload of its already verified token, its `sub`
+        '''
+        if not self.enabled:
+            return
+        self._take('ip:%s' % self.client_ip(), self.ip_rate, self.ip_burst)
+        if verified_payload is not None:
+            self.check_user(verified_payload)
+
+    def check_user(self, verified_payload):
+        '''aborts with 429 when the `sub` of a verified token ran out'''
+        if not self.enabled or not isinstance(verified_payload, dict):
+            return
+        if verified_payload.get('sub'):
+            self._take('sub:%s' % verified_payload['sub'], self.rate,
+                       self.burst)
+
+    def _take(self, key, rate, burst):
+        try:
+            allowed, retry_after = self.buckets.take(key, rate, burst)
+        except Exception:
+            self.errors += 1
+            logger.warning("rate limit backend failed, letting %s through",
+                           key, exc_info=True)
+            return
+        if not allowed:
+            self.limited += 1
+            raise TooManyRequests(retry_after=max(1, math.ceil(retry_after)))
+
+    def stats(self):
+        return {
+            "limited": self.limited,
+            "errors": self.errors
+        }
+
+
+rate_limiter = RateLimiter()
+
+'''
+LoadShedder
+    turns requests away with a fast 503 instead of letting them time out
+    - when more than `max_in_flight` requests are being served by this
+      worker (gevent workers serve many at once)
+    - when a request waited longer than `max_queue_seconds` before reaching
+      the worker, measured from the X-Request-Start header set by the
+      router (Heroku) or proxy (nginx `t=${msec}`)
+    endpoints in `exempt` (metrics, health checks) are always served
+'''
+
+
+class LoadShedder:
+    def __init__(self):
+        self.max_in_flight = 0
+        self.max_queue_seconds = 0
+        self.exempt = set()
+        self.in_flight = 0
+        self.shed = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_in_flight = app.config['SHED_MAX_IN_FLIGHT']
+        self.max_queue_seconds = app.config['SHED_MAX_QUEUE_MS'] / 1000
+        self.in_flight = 0
+        self.shed = 0
+        app.before_request(self.admit)
+        app.teardown_request(self.release)
+
+    def queue_seconds(self):
+        header = request.headers.get('X-Request-Start')
+        if not header:
+            return None
+        try:
+            started = float(header.strip().lstrip('t='))
+        except ValueError:
+            return None
+        # seconds, milliseconds or microseconds since the epoch
+        while started > 1e11:
+            started /= 1000
+        return max(0.0, time.time() - started)
+
+    def admit(self):
+        if request.endpoint in self.exempt:
+            return
+        with self._lock:
+            self.in_flight += 1
+            in_flight = self.in_flight
+        g.load_shedder_admitted = True
+
+        overloaded = self.max_in_flight and in_flight > self.max_in_flight
+        if not overloaded and self.max_queue_seconds:
+            queued = self.queue_seconds()
+            overloaded = queued is not None and \
+                queued > self.max_queue_seconds
+        if overloaded:
+            with self._lock:
+                self.shed += 1
+            raise ServiceUnavailable(retry_after=1)
+
+    def release(self, error=None):
+        if g.pop('load_shedder_admitted', False):
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "shed": self.shed
+        }
+
+
+load_shedder = LoadShedder()
@@ -0,0 +1,81 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+'''
+VerifiedTokenCache
+    bounded LRU of already verified JWT payloads
+    - keyed by the sha256 of the raw token, the token itself is never stored
+    - an entry expires at the token's `exp` claim, tokens without one
+      are not cached
+'''
+
+
+class VerifiedTokenCache:
+    def __init__(self, maxsize=1024, enabled=True):
+        self.maxsize = maxsize
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        if not self.enabled:
+            return None
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, payload = entry
+            if time.time() >= expires_at:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def peek(self, token):
+        '''the cached payload of `token`, not counted as a hit or miss'''
+        if not self.enabled:
+            return None
+        entry = self._entries.get(self._key(token))
+        if entry is None or time.time() >= entry[0]:
+            return None
+        return entry[1]
+
+    def put(self, token, payload):
+        if not self.enabled or self.maxsize <= 0:
+            return
+        expires_at = payload.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses
+        }